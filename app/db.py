@@ -1,44 +1,208 @@
 import sqlite3
 import os
-import datetime
+import atexit
 import logging
+import queue
 import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
 from typing import List, Optional, Tuple, Dict
 
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "apps.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_STATEMENT_CACHE = 256
+LOG_BATCH_SIZE = 256
+LOG_FLUSH_INTERVAL = 0.2
+
+# Hot-path SQL lives in module constants so every call passes the exact same
+# string and hits sqlite3's per-connection prepared statement cache.
+_SQL_UPSERT_APP = (
+    "INSERT INTO apps (slug, user_id, html_content, created_at, updated_at) "
+    "VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT(slug, user_id) DO UPDATE SET "
+    "html_content = excluded.html_content, updated_at = excluded.updated_at"
+)
+_APP_COLS = ("slug", "user_id", "html_content", "created_at", "updated_at")
+_APP_LIST_COLS = ("slug", "updated_at", "user_id")
+_USER_COLS = ("id", "key", "comment", "created_at")
+
+_SQL_GET_APP = "SELECT slug, user_id, html_content, created_at, updated_at FROM apps WHERE slug = ? AND user_id = ?"
+_SQL_LIST_APPS_USER = (
+    "SELECT slug, updated_at, user_id FROM apps WHERE user_id = ? "
+    "ORDER BY updated_at DESC LIMIT ? OFFSET ?"
+)
+_SQL_LIST_APPS_ALL = "SELECT slug, updated_at, user_id FROM apps ORDER BY updated_at DESC LIMIT ? OFFSET ?"
+_SQL_DELETE_APP = "DELETE FROM apps WHERE slug = ? AND user_id = ?"
+_SQL_GET_USER_BY_KEY = "SELECT id, key, comment, created_at FROM users WHERE key = ?"
+_SQL_CREATE_USER = (
+    "INSERT INTO users (key, comment, created_at) VALUES (?, ?, ?) "
+    "RETURNING id, key, comment, created_at"
+)
+_SQL_LIST_USERS = "SELECT id, key, comment, created_at FROM users ORDER BY id ASC"
+_SQL_LOG_ACTION = "INSERT INTO access_logs (user_id, action, slug, timestamp) VALUES (?, ?, ?, ?)"
+_SQL_USERS_STATS = '''
+    SELECT user_id,
+        SUM(CASE WHEN src = 'log' AND action = 'generate' THEN n ELSE 0 END) AS generated,
+        SUM(CASE WHEN src = 'log' AND action = 'view_stateless' THEN n ELSE 0 END) AS view_stateless,
+        SUM(CASE WHEN src = 'log' AND action = 'view_persistent' THEN n ELSE 0 END) AS view_persistent,
+        SUM(CASE WHEN src = 'app' THEN n ELSE 0 END) AS apps_count
+    FROM (
+        SELECT user_id, action, 'log' AS src, COUNT(*) AS n FROM access_logs GROUP BY user_id, action
+        UNION ALL
+        SELECT user_id, NULL, 'app', COUNT(*) FROM apps GROUP BY user_id
+    )
+    GROUP BY user_id
+'''
+_SQL_USER_STATS = '''
+    SELECT
+        (SELECT COUNT(*) FROM access_logs WHERE user_id = :uid AND action = 'generate'),
+        (SELECT COUNT(*) FROM access_logs WHERE user_id = :uid AND action = 'view_stateless'),
+        (SELECT COUNT(*) FROM access_logs WHERE user_id = :uid AND action = 'view_persistent'),
+        (SELECT COUNT(*) FROM apps WHERE user_id = :uid)
+'''
+
+_TIMESTAMP_COLUMNS = {
+    "users": ("created_at",),
+    "apps": ("created_at", "updated_at"),
+    "access_logs": ("timestamp",),
+}
+
+def _now_ms() -> int:
+    """
+    Current UTC time as integer epoch milliseconds (the storage format for all timestamps).
+    """
+    return int(time.time() * 1000)
 
-_local = threading.local()
+class PooledConnection(sqlite3.Connection):
+    # Cleared when a query on this connection fails with anything but a constraint error
+    healthy = True
 
-def get_connection():
-    conn = getattr(_local, "conn", None)
-    if conn is not None:
-        try:
-            # Check if connection is still open
-            conn.total_changes
-        except (sqlite3.ProgrammingError, sqlite3.OperationalError):
-            conn = None
-
-    if conn is None:
-        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        # Enable FK support and WAL mode
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections shared by all request threads.
+    Connections are opened once (with pragmas applied) and reused.
+    """
+
+    def __init__(self, path: str, size: int = DB_POOL_SIZE):
+        self.path = path
+        self.closed = False
+        self._pool = queue.Queue(maxsize=size)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for _ in range(size):
+            self._pool.put(self._create_connection())
+
+    def _create_connection(self) -> PooledConnection:
+        conn = sqlite3.connect(
+            self.path, check_same_thread=False, cached_statements=DB_STATEMENT_CACHE,
+            factory=PooledConnection,
+        )
+        # Enable FK support and WAL mode; NORMAL sync is durable enough under WAL
         conn.execute("PRAGMA foreign_keys = ON;")
         conn.execute("PRAGMA journal_mode = WAL;")
-        _local.conn = conn
-    return conn
+        conn.execute("PRAGMA synchronous = NORMAL;")
+        conn.execute("PRAGMA temp_store = MEMORY;")
+        conn.execute("PRAGMA cache_size = -65536;")  # 64 MiB
+        conn.execute("PRAGMA mmap_size = 268435456;")  # 256 MiB
+        conn.execute("PRAGMA busy_timeout = 5000;")
+        return conn
+
+    def get_connection(self, timeout: Optional[float] = None) -> PooledConnection:
+        conn = self._pool.get(timeout=timeout)
+        if conn.healthy:
+            return conn
+        # Only connections that saw an error pay for a round-trip probe
+        try:
+            conn.execute("SELECT 1").fetchone()
+            conn.healthy = True
+        except sqlite3.Error:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            conn = self._create_connection()
+        return conn
+
+    def put_connection(self, conn: sqlite3.Connection):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.healthy = False
+        if self.closed:
+            conn.close()
+            return
+        self._pool.put_nowait(conn)
+
+    @contextmanager
+    def get_conn(self, timeout: Optional[float] = None):
+        conn = self.get_connection(timeout)
+        try:
+            yield conn
+        except sqlite3.Error as e:
+            if not isinstance(e, sqlite3.IntegrityError):
+                conn.healthy = False
+            raise
+        finally:
+            self.put_connection(conn)
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    with _pool_lock:
+        # DB_PATH may be swapped at runtime (tests), so rebuild the pool on change
+        if _pool is None or _pool.path != DB_PATH:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DB_PATH)
+            _invalidate_users_cache()
+            _invalidate_apps_cache()
+        return _pool
+
+@contextmanager
+def get_conn(timeout: Optional[float] = None):
+    with get_pool().get_conn(timeout) as conn:
+        yield conn
 
 def init_db():
-    conn = get_connection()
-    c = conn.cursor()
+    with get_conn() as conn:
+        # PRAGMA foreign_keys is a no-op inside a transaction, so it is toggled
+        # around the single transaction that wraps the whole schema setup.
+        # The placeholder admin (see _ensure_admin_user) satisfies the FKs anyway.
+        conn.execute("PRAGMA foreign_keys = OFF;")
+        try:
+            with conn:
+                conn.execute("BEGIN")
+                _init_schema(conn.cursor())
+        except Exception as e:
+            logging.error(f"Database initialization failed: {e}")
+            raise
+        finally:
+            conn.execute("PRAGMA foreign_keys = ON;")
+
+    # Migrations may have touched the users table
+    _invalidate_users_cache()
+    _invalidate_apps_cache()
+    _start_log_writer()
 
+def _init_schema(c):
     # 1. Create users table
     c.execute('''
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             key TEXT UNIQUE NOT NULL,
             comment TEXT,
-            created_at TIMESTAMP
+            created_at INTEGER
         )
     ''')
 
@@ -64,7 +228,6 @@ def init_db():
             SELECT slug, 1, html_content, created_at, updated_at FROM apps_old
         ''')
         c.execute("DROP TABLE apps_old")
-        conn.commit()
 
     # 2. Check if apps table needs migration
     try:
@@ -80,33 +243,21 @@ def init_db():
 
     if needs_migration:
         logging.info("Migrating database to multi-user schema...")
-        try:
-            # In SQLite, PRAGMA foreign_keys should be set before BEGIN.
-            conn.execute("PRAGMA foreign_keys = OFF;")
-            conn.execute("BEGIN TRANSACTION;")
-
-            # Create placeholder admin to satisfy FK during migration.
-            # sync_admin_key() will update the key later.
-            _ensure_admin_user(c, "Admin (Auto-migrated)")
 
-            c.execute("ALTER TABLE apps RENAME TO apps_old")
-            _create_new_apps_table(c)
+        # Create placeholder admin to satisfy FK during migration.
+        # sync_admin_key() will update the key later.
+        _ensure_admin_user(c, "Admin (Auto-migrated)")
 
-            c.execute('''
-                INSERT INTO apps (slug, user_id, html_content, created_at, updated_at)
-                SELECT slug, 1, html_content, created_at, updated_at FROM apps_old
-            ''')
+        c.execute("ALTER TABLE apps RENAME TO apps_old")
+        _create_new_apps_table(c)
 
-            c.execute("DROP TABLE apps_old")
-            conn.execute("COMMIT;")
-            logging.info("Migration completed successfully.")
+        c.execute('''
+            INSERT INTO apps (slug, user_id, html_content, created_at, updated_at)
+            SELECT slug, 1, html_content, created_at, updated_at FROM apps_old
+        ''')
 
-        except Exception as e:
-            conn.execute("ROLLBACK;")
-            logging.error(f"Migration failed: {e}")
-            raise e
-        finally:
-            conn.execute("PRAGMA foreign_keys = ON;")
+        c.execute("DROP TABLE apps_old")
+        logging.info("Migration completed successfully.")
 
     # 3. Create access_logs table
     c.execute('''
@@ -115,12 +266,24 @@ def init_db():
             user_id INTEGER,
             action TEXT NOT NULL,
             slug TEXT,
-            timestamp TIMESTAMP,
+            timestamp INTEGER,
             FOREIGN KEY (user_id) REFERENCES users(id)
         )
     ''')
 
-    conn.commit()
+    # 4. Convert legacy TEXT timestamps (datetime adapter output) to epoch milliseconds.
+    # Existing TIMESTAMP columns have NUMERIC affinity and store the integers natively.
+    for table, columns in _TIMESTAMP_COLUMNS.items():
+        for column in columns:
+            c.execute(f'''
+                UPDATE {table}
+                SET {column} = CAST(ROUND((julianday({column}) - 2440587.5) * 86400000) AS INTEGER)
+                WHERE typeof({column}) = 'text'
+            ''')
+
+    # 5. Indexes for list_apps ordering and stats aggregation
+    c.execute("CREATE INDEX IF NOT EXISTS idx_apps_user_updated ON apps(user_id, updated_at DESC)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_logs_user_action ON access_logs(user_id, action)")
 
 def _create_new_apps_table(cursor):
     cursor.execute('''
@@ -128,8 +291,8 @@ def _create_new_apps_table(cursor):
             slug TEXT NOT NULL,
             user_id INTEGER NOT NULL,
             html_content TEXT,
-            created_at TIMESTAMP,
-            updated_at TIMESTAMP,
+            created_at INTEGER,
+            updated_at INTEGER,
             PRIMARY KEY (slug, user_id),
             FOREIGN KEY (user_id) REFERENCES users(id)
         )
@@ -141,7 +304,7 @@ def _ensure_admin_user(cursor, comment: str):
     if cursor.fetchone():
         return
 
-    now = datetime.datetime.utcnow()
+    now = _now_ms()
     key = "legacy-admin"
     suffix = 0
     while True:
@@ -161,156 +324,234 @@ def sync_admin_key(env_key: str):
     if not env_key:
         return
 
-    conn = get_connection()
-    now = datetime.datetime.utcnow()
+    now = _now_ms()
+    with get_conn() as conn:
+        with conn:
+            c = conn.cursor()
+            c.execute("SELECT key FROM users WHERE id = 1")
+            admin = c.fetchone()
+
+            if admin:
+                if admin[0] != env_key:
+                    logging.warning("Updating Admin (ID 1) key to match environment variable.")
+                    c.execute("UPDATE users SET key = ? WHERE id = 1", (env_key,))
+            else:
+                logging.info("Creating Admin User (ID 1) from environment key.")
+                try:
+                    c.execute("INSERT INTO users (id, key, comment, created_at) VALUES (1, ?, 'Admin (System)', ?)", (env_key, now))
+                except sqlite3.IntegrityError:
+                    logging.error("Failed to insert Admin user. Key might be in use?")
+
+    _invalidate_users_cache()
+
+def save_app(slug: str, html_content: str, user_id: int = 1):
+    now = _now_ms()
+    with get_conn() as conn:
+        with conn:
+            # created_at is only taken on insert; on conflict it is left untouched
+            conn.execute(_SQL_UPSERT_APP, (slug, user_id, html_content, now, now))
+    _invalidate_apps_cache()
 
-    with conn:
+def get_app(slug: str, user_id: int = 1) -> Optional[dict]:
+    with get_conn() as conn:
         c = conn.cursor()
-        c.execute("SELECT * FROM users WHERE id = 1")
-        admin = c.fetchone()
+        c.execute(_SQL_GET_APP, (slug, user_id))
+        row = c.fetchone()
+    if row:
+        return dict(zip(_APP_COLS, row))
+    return None
 
-        if admin:
-            if admin['key'] != env_key:
-                logging.warning("Updating Admin (ID 1) key to match environment variable.")
-                c.execute("UPDATE users SET key = ? WHERE id = 1", (env_key,))
-        else:
-            logging.info("Creating Admin User (ID 1) from environment key.")
-            try:
-                c.execute("INSERT INTO users (id, key, comment, created_at) VALUES (1, ?, 'Admin (System)', ?)", (env_key, now))
-            except sqlite3.IntegrityError:
-                logging.error("Failed to insert Admin user. Key might be in use?")
+# Bumped on every write to the apps table, so callers can cache rendered apps
+_apps_epoch = 0
+# Guards the apps and users epochs: writes come from threadpool request threads,
+# and an unlocked `+= 1` can lose a bump
+_epoch_lock = threading.Lock()
 
-def save_app(slug: str, html_content: str, user_id: int = 1):
-    conn = get_connection()
-    now = datetime.datetime.utcnow()
+def _invalidate_apps_cache():
+    global _apps_epoch
+    with _epoch_lock:
+        _apps_epoch += 1
 
-    with conn:
+def apps_version() -> int:
+    """
+    Changes whenever the apps table may have changed; callers can key caches on it.
+    """
+    return _apps_epoch
+
+def list_apps(user_id: Optional[int] = None, limit: Optional[int] = None, offset: int = 0) -> List[dict]:
+    # LIMIT -1 means "no limit" in SQLite
+    limit = -1 if limit is None else limit
+    with get_conn() as conn:
         c = conn.cursor()
-        c.execute("SELECT slug FROM apps WHERE slug = ? AND user_id = ?", (slug, user_id))
-        exists = c.fetchone()
 
-        if exists:
-            c.execute('''
-                UPDATE apps SET html_content = ?, updated_at = ? WHERE slug = ? AND user_id = ?
-            ''', (html_content, now, slug, user_id))
+        if user_id is not None:
+            c.execute(_SQL_LIST_APPS_USER, (user_id, limit, offset))
         else:
-            c.execute('''
-                INSERT INTO apps (slug, user_id, html_content, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (slug, user_id, html_content, now, now))
+            c.execute(_SQL_LIST_APPS_ALL, (limit, offset))
 
-def get_app(slug: str, user_id: int = 1) -> Optional[dict]:
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT * FROM apps WHERE slug = ? AND user_id = ?", (slug, user_id))
-    row = c.fetchone()
-    if row:
-        return dict(row)
-    return None
+        rows = c.fetchall()
+    return [dict(zip(_APP_LIST_COLS, row)) for row in rows]
 
-def list_apps(user_id: Optional[int] = None) -> List[dict]:
-    conn = get_connection()
-    c = conn.cursor()
+def delete_app(slug: str, user_id: int = 1):
+    with get_conn() as conn:
+        with conn:
+            c = conn.cursor()
+            c.execute(_SQL_DELETE_APP, (slug, user_id))
+    _invalidate_apps_cache()
 
-    if user_id is not None:
-        c.execute("SELECT slug, updated_at, user_id FROM apps WHERE user_id = ? ORDER BY updated_at DESC", (user_id,))
-    else:
-        c.execute("SELECT slug, updated_at, user_id FROM apps ORDER BY updated_at DESC")
+# --- User Management Functions ---
 
-    rows = c.fetchall()
-    return [dict(row) for row in rows]
+# Users change rarely, so key lookups are cached in-process. Every write to the
+# users table bumps the epoch, which is part of the cache key.
+_users_epoch = 0
 
-def delete_app(slug: str, user_id: int = 1):
-    conn = get_connection()
-    with conn:
-        c = conn.cursor()
-        c.execute("DELETE FROM apps WHERE slug = ? AND user_id = ?", (slug, user_id))
+def _invalidate_users_cache():
+    global _users_epoch
+    with _epoch_lock:
+        _users_epoch += 1
+    _get_user_row_by_key.cache_clear()
 
-# --- User Management Functions ---
+def users_version() -> int:
+    """
+    Changes whenever the users table may have changed; callers can key caches on it.
+    """
+    return _users_epoch
+
+@lru_cache(maxsize=1024)
+def _get_user_row_by_key(key: str, epoch: int) -> Optional[tuple]:
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute(_SQL_GET_USER_BY_KEY, (key,))
+        return c.fetchone()
 
 def get_user_by_key(key: str) -> Optional[dict]:
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT * FROM users WHERE key = ?", (key,))
-    row = c.fetchone()
+    row = _get_user_row_by_key(key, _users_epoch)
     if row:
-        return dict(row)
+        return dict(zip(_USER_COLS, row))
     return None
 
-def create_user(key: str, comment: str = None) -> int:
-    conn = get_connection()
-    now = datetime.datetime.utcnow()
-    try:
-        with conn:
-            c = conn.cursor()
-            c.execute("INSERT INTO users (key, comment, created_at) VALUES (?, ?, ?)", (key, comment, now))
-            new_id = c.lastrowid
-    except sqlite3.IntegrityError:
-        raise ValueError("Key already exists")
-    return new_id
+def create_user(key: str, comment: str = None) -> dict:
+    now = _now_ms()
+    with get_conn() as conn:
+        try:
+            with conn:
+                c = conn.cursor()
+                # RETURNING hands back the stored row, so callers don't need a re-read
+                row = c.execute(_SQL_CREATE_USER, (key, comment, now)).fetchone()
+            _invalidate_users_cache()
+        except sqlite3.IntegrityError:
+            raise ValueError("Key already exists")
+        return dict(zip(_USER_COLS, row))
 
 def list_users() -> List[dict]:
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT * FROM users ORDER BY id ASC")
-    rows = c.fetchall()
-    return [dict(row) for row in rows]
+    with get_conn() as conn:
+        c = conn.cursor()
+        c.execute(_SQL_LIST_USERS)
+        rows = c.fetchall()
+    return [dict(zip(_USER_COLS, row)) for row in rows]
 
 # --- Stats & Logs ---
 
-def log_action(user_id: int, action: str, slug: Optional[str] = None):
-    conn = get_connection()
-    now = datetime.datetime.utcnow()
-    with conn:
-        c = conn.cursor()
-        c.execute("INSERT INTO access_logs (user_id, action, slug, timestamp) VALUES (?, ?, ?, ?)",
-                  (user_id, action, slug, now))
+_log_queue: "queue.Queue[tuple]" = queue.Queue()
+_log_flush_lock = threading.Lock()
+_log_writer: Optional[threading.Thread] = None
 
-def get_users_stats() -> Dict[int, dict]:
+def log_action(user_id: int, action: str, slug: Optional[str] = None):
     """
-    Returns statistics per user_id.
-    Structure: { user_id: { 'generated': 0, 'view_stateless': 0, 'apps_count': 0, 'view_persistent': 0 } }
+    Queues an access log row; a background thread writes them in batches.
     """
-    conn = get_connection()
-    c = conn.cursor()
-
-    stats = {}
-
-    # 1. Logs aggregation
-    c.execute('''
-        SELECT user_id, action, COUNT(*) as count
-        FROM access_logs
-        GROUP BY user_id, action
-    ''')
-    rows = c.fetchall()
+    _log_queue.put_nowait((user_id, action, slug, _now_ms()))
 
-    for row in rows:
-        uid = row['user_id']
-        action = row['action']
-        count = row['count']
+def flush_logs() -> int:
+    """
+    Writes all queued access log rows, LOG_BATCH_SIZE rows per transaction.
+    Returns the number of rows written.
+    """
+    written = 0
+    with _log_flush_lock:
+        while True:
+            rows = []
+            while len(rows) < LOG_BATCH_SIZE:
+                try:
+                    rows.append(_log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not rows:
+                return written
+            try:
+                with get_conn() as conn:
+                    with conn:
+                        conn.executemany(_SQL_LOG_ACTION, rows)
+                written += len(rows)
+            except sqlite3.IntegrityError:
+                # One bad row (e.g. a user_id with no users row) fails the whole batch;
+                # retry row by row so only the offending rows are dropped
+                written += _write_log_rows_one_by_one(rows)
+            except sqlite3.Error as e:
+                logging.error(f"Failed to write {len(rows)} access log rows: {e}")
+
+def _write_log_rows_one_by_one(rows: List[tuple]) -> int:
+    written = 0
+    with get_conn() as conn:
+        with conn:
+            for row in rows:
+                try:
+                    conn.execute(_SQL_LOG_ACTION, row)
+                    written += 1
+                except sqlite3.IntegrityError as e:
+                    logging.error(f"Dropping access log row {row}: {e}")
+    return written
+
+def _log_writer_loop():
+    while True:
+        time.sleep(LOG_FLUSH_INTERVAL)
+        flush_logs()
 
-        if uid not in stats:
-            stats[uid] = {'generated': 0, 'view_stateless': 0, 'view_persistent': 0, 'apps_count': 0}
+def _start_log_writer():
+    global _log_writer
+    with _pool_lock:
+        if _log_writer is not None and _log_writer.is_alive():
+            return
+        _log_writer = threading.Thread(target=_log_writer_loop, name="access-log-writer", daemon=True)
+        _log_writer.start()
 
-        if action == 'generate':
-            stats[uid]['generated'] = count
-        elif action == 'view_stateless':
-            stats[uid]['view_stateless'] = count
-        elif action == 'view_persistent':
-            stats[uid]['view_persistent'] = count
+atexit.register(flush_logs)
 
-    # 2. Apps count
-    c.execute('''
-        SELECT user_id, COUNT(*) as count
-        FROM apps
-        GROUP BY user_id
-    ''')
-    rows = c.fetchall()
-    for row in rows:
-        uid = row['user_id']
-        count = row['count']
-        if uid not in stats:
-            stats[uid] = {'generated': 0, 'view_stateless': 0, 'view_persistent': 0, 'apps_count': 0}
-        stats[uid]['apps_count'] = count
-
-    return stats
+def get_users_stats() -> Dict[int, dict]:
+    """
+    Returns statistics per user_id.
+    Structure: { user_id: { 'generated': 0, 'view_stateless': 0, 'apps_count': 0, 'view_persistent': 0 } }
+    """
+    # Make sure recently queued actions are counted
+    flush_logs()
+    with get_conn() as conn:
+        rows = conn.execute(_SQL_USERS_STATS).fetchall()
+
+    return {
+        uid: {
+            'generated': generated,
+            'view_stateless': view_stateless,
+            'view_persistent': view_persistent,
+            'apps_count': apps_count,
+        }
+        for uid, generated, view_stateless, view_persistent, apps_count in rows
+    }
+
+def get_user_stats(user_id: int) -> dict:
+    """
+    Statistics for a single user, same shape as a get_users_stats() entry.
+    Users with no activity get zeros. Each count is an index lookup
+    (idx_logs_user_action / idx_apps_user_updated), not a scan of all users.
+    """
+    flush_logs()
+    with get_conn() as conn:
+        generated, view_stateless, view_persistent, apps_count = conn.execute(
+            _SQL_USER_STATS, {"uid": user_id}
+        ).fetchone()
+
+    return {
+        'generated': generated,
+        'view_stateless': view_stateless,
+        'view_persistent': view_persistent,
+        'apps_count': apps_count,
+    }
@@ -1,22 +1,30 @@
 import os
+import datetime
 import zlib
-import base64
+import gzip
 import hmac
 import hashlib
 import secrets
 import logging
 import re
-from typing import Optional, List
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterator, Optional, List, Tuple, Union
 
+import brotli
+import pybase64
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
 from db import (
     init_db, save_app, get_app, list_apps, delete_app,
     sync_admin_key, get_user_by_key, create_user, list_users,
-    log_action, get_users_stats
+    log_action, get_users_stats, users_version, apps_version
 )
 
 app = FastAPI(title="Stateless App Runner")
@@ -64,69 +72,244 @@ if not DEFAULT_SECRET:
 sync_admin_key(DEFAULT_SECRET)
 
 DEFAULT_DOMAIN = os.getenv("APP_DOMAIN", "https://mtlminiapps.us")
+_DEFAULT_URL_PREFIX = DEFAULT_DOMAIN.rstrip('/') + '/?d='
 
 # --- CORE LOGIC ---
 
-def sign_data(data: str, key: str) -> str:
-    key_bytes = key.encode('utf-8')
-    return hmac.new(key_bytes, data.encode('utf-8'), hashlib.sha256).hexdigest()
-
-def compress_payload(html: str) -> str:
-    compressed = zlib.compress(html.encode('utf-8'), level=9)
-    return base64.urlsafe_b64encode(compressed).decode('utf-8').rstrip('=')
+_HMAC_BLOCK_SIZE = 64  # SHA-256 block size
+_IPAD = bytes(x ^ 0x36 for x in range(256))
+_OPAD = bytes(x ^ 0x5C for x in range(256))
+
+@lru_cache(maxsize=1024)
+def _hmac_pads(key: str) -> Tuple["hashlib._Hash", "hashlib._Hash"]:
+    # HMAC-SHA256 (RFC 2104) with the inner/outer pad blocks hashed once per key;
+    # sign_data() only copies the prepared SHA-256 states.
+    key_block = key.encode('utf-8')
+    if len(key_block) > _HMAC_BLOCK_SIZE:
+        key_block = hashlib.sha256(key_block).digest()
+    key_block = key_block.ljust(_HMAC_BLOCK_SIZE, b'\0')
+    return hashlib.sha256(key_block.translate(_IPAD)), hashlib.sha256(key_block.translate(_OPAD))
+
+# New links carry the 32-byte digest as unpadded base64url (43 chars, the last one
+# restricted to its canonical form); older links used a 64-char hexdigest
+_SIGNATURE_RE = re.compile(r'[0-9a-f]{64}|[A-Za-z0-9_-]{42}[AEIMQUYcgkosw048]')
+
+def decode_signature(s: str) -> bytes:
+    # `s` must already match _SIGNATURE_RE
+    if len(s) == 64:
+        return bytes.fromhex(s)
+    return pybase64.urlsafe_b64decode(s + '=')
+
+@lru_cache(maxsize=1024)
+def key_id(key: str) -> str:
+    # Short public fingerprint of a signing key, sent as `k` so run_app can pick the
+    # key directly instead of trying every one (like a JWT "kid")
+    return hashlib.sha256(b'kid:' + key.encode('utf-8')).hexdigest()[:8]
+
+def sign_digest(data: Union[str, bytes], key: str) -> bytes:
+    inner_pad, outer_pad = _hmac_pads(key)
+    inner = inner_pad.copy()
+    inner.update(data if isinstance(data, bytes) else data.encode('utf-8'))
+    outer = outer_pad.copy()
+    outer.update(inner.digest())
+    return outer.digest()
+
+def sign_data(data: Union[str, bytes], key: str) -> str:
+    return pybase64.urlsafe_b64encode(sign_digest(data, key))[:-1].decode('ascii')
+
+# New payloads are Brotli-compressed and tagged with a leading "b"; tiny pages that
+# Brotli can't shrink are stored as-is under "r".
+# Legacy zlib payloads always start with "e" (the 0x78 zlib header), so they still decode.
+BROTLI_TAG = 'b'
+RAW_TAG = 'r'
+BROTLI_QUALITY = 10  # q11 is ~2.5x slower for ~2% smaller output
+
+def compress_payload(html: Union[str, bytes]) -> str:
+    raw = html if isinstance(html, bytes) else html.encode('utf-8')
+    compressed = brotli.compress(raw, mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+    tag = BROTLI_TAG
+    if len(compressed) >= len(raw):
+        tag, compressed = RAW_TAG, raw
+    encoded = pybase64.urlsafe_b64encode(compressed)
+    # Drop the '=' padding by decoding a view of the unpadded prefix instead of copying via rstrip
+    return tag + str(memoryview(encoded)[:(len(compressed) * 4 + 2) // 3], 'ascii')
+
+# Decompressed output is produced in slices of this size; larger payloads are streamed
+STREAM_CHUNK_SIZE = 64 * 1024
+# Upper bound on decompressed HTML, so a small "zip bomb" link can't pin a worker
+MAX_HTML_BYTES = int(os.getenv("MAX_HTML_BYTES", str(8 * 1024 * 1024)))
+
+def _payload_encoding(payload: str) -> Optional[str]:
+    # The HTTP content coding of the data ('br', 'deflate', or None for raw HTML)
+    if payload.startswith(BROTLI_TAG):
+        return 'br'
+    if payload.startswith(RAW_TAG):
+        return None
+    return 'deflate'
+
+def _decode_payload(payload: str) -> Tuple[Optional[str], bytes]:
+    encoding = _payload_encoding(payload)
+    if encoding != 'deflate':
+        payload = payload[1:]  # strip the BROTLI_TAG / RAW_TAG prefix
+    # (-n) & 3 is the number of '=' needed to reach a multiple of 4
+    return encoding, pybase64.urlsafe_b64decode(payload + '==='[:-len(payload) & 3])
+
+class PayloadTooLarge(ValueError):
+    pass
+
+def _iter_decompressed(payload: str, chunk_size: int) -> Iterator[bytes]:
+    encoding, compressed_data = _decode_payload(payload)
+    if encoding is None:
+        for i in range(0, max(len(compressed_data), 1), chunk_size):
+            yield compressed_data[i:i + chunk_size]
+    elif encoding == 'br':
+        decompressor = brotli.Decompressor()
+        chunk = decompressor.process(compressed_data, output_buffer_limit=chunk_size)
+        yield chunk
+        # All input is already fed in; drain the remaining output
+        while not decompressor.is_finished():
+            chunk = decompressor.process(b'', output_buffer_limit=chunk_size)
+            if not chunk:
+                break
+            yield chunk
+        if not decompressor.is_finished():
+            raise brotli.error("Truncated payload")
+    else:
+        decompressor = zlib.decompressobj()
+        chunk = decompressor.decompress(compressed_data, chunk_size)
+        while True:
+            yield chunk
+            if not decompressor.unconsumed_tail:
+                break
+            chunk = decompressor.decompress(decompressor.unconsumed_tail, chunk_size)
+        if not decompressor.eof:
+            raise zlib.error("Truncated payload")
+
+def iter_decompressed_payload(payload: str, chunk_size: int = STREAM_CHUNK_SIZE,
+                              max_bytes: Optional[int] = None) -> Iterator[bytes]:
+    # Output is produced lazily in chunk_size slices, so decompression stops
+    # as soon as the limit is crossed instead of inflating the whole payload
+    limit = MAX_HTML_BYTES if max_bytes is None else max_bytes
+    total = 0
+    for chunk in _iter_decompressed(payload, chunk_size):
+        total += len(chunk)
+        if total > limit:
+            raise PayloadTooLarge("Payload too large")
+        yield chunk
 
 def decompress_payload(payload: str) -> str:
-    padding = 4 - (len(payload) % 4)
-    if padding != 4:
-        payload += '=' * padding
-    compressed_data = base64.urlsafe_b64decode(payload)
-    return zlib.decompress(compressed_data).decode('utf-8')
+    return b"".join(iter_decompressed_payload(payload)).decode('utf-8')
+
+# Tokenizes a script body: `//` comments match outside the group and are dropped;
+# string/template literals (escapes honoured, unterminated ones run to the end),
+# plain runs and lone slashes are captured and kept. findall() + join stays in C.
+_JS_TOKEN_RE = re.compile(
+    r'''//[^\n]*|("[^"\\]*(?:\\[\s\S][^"\\]*)*"?'''
+    r'''|'[^'\\]*(?:\\[\s\S][^'\\]*)*'?'''
+    r'''|`[^`\\]*(?:\\[\s\S][^`\\]*)*`?'''
+    r'''|[^"'`/]+|/)'''
+)
 
 def remove_js_comments(text: str) -> str:
-    out = []
-    i = 0
-    n = len(text)
-    in_quote = None
-    while i < n:
-        char = text[i]
-        if in_quote:
-            if char == in_quote:
-                escaped = False
-                j = i - 1
-                backslashes = 0
-                while j >= 0 and text[j] == '\\':
-                    backslashes += 1
-                    j -= 1
-                if backslashes % 2 == 0:
-                    in_quote = None
-            out.append(char)
-            i += 1
-            continue
-        if char in ('"', "'", '`'):
-            in_quote = char
-            out.append(char)
-            i += 1
-            continue
-        if char == '/' and i + 1 < n and text[i+1] == '/':
-            i += 2
-            while i < n and text[i] != '\n':
-                i += 1
-            continue
-        out.append(char)
-        i += 1
-    return "".join(out)
+    return "".join(_JS_TOKEN_RE.findall(text))
+
+_RE_HTML_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+# Comments, <script> and <style> blocks are handled in a single pass; whitespace is
+# collapsed in a second, callback-free pass (a Python callback per whitespace run
+# would cost more than the extra scan). str.split() splits on the same characters
+# as \s and does that pass ~3.5x faster than a regex sub.
+_RE_MINIFY_BLOCKS = re.compile(
+    r'<(?:!--.*?-->|(script[^>]*>)(.*?)(</script>)|(style[^>]*>)(.*?)(</style>))',
+    re.DOTALL | re.IGNORECASE,
+)
+_RE_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+
+def _minify_block(match):
+    if match.group(1) is not None:
+        body = remove_js_comments(_RE_HTML_COMMENT.sub('', match.group(2)))
+        return '<' + match.group(1) + body + match.group(3)
+    if match.group(4) is not None:
+        body = _RE_CSS_COMMENT.sub('', _RE_HTML_COMMENT.sub('', match.group(5)))
+        return '<' + match.group(4) + body + match.group(6)
+    return ''
 
 def minify_html(html_content: str) -> str:
-    html_content = re.sub(r'<!--.*?-->', '', html_content, flags=re.DOTALL)
-    def process_script(match):
-        return match.group(1) + remove_js_comments(match.group(2)) + match.group(3)
-    html_content = re.sub(r'(<script[^>]*>)(.*?)(</script>)', process_script, html_content, flags=re.DOTALL | re.IGNORECASE)
-    def process_style(match):
-        content = re.sub(r'/\*.*?\*/', '', match.group(2), flags=re.DOTALL)
-        return match.group(1) + content + match.group(3)
-    html_content = re.sub(r'(<style[^>]*>)(.*?)(</style>)', process_style, html_content, flags=re.DOTALL | re.IGNORECASE)
-    html_content = re.sub(r'\s+', ' ', html_content)
-    return html_content.strip()
+    html_content = _RE_MINIFY_BLOCKS.sub(_minify_block, html_content)
+    return ' '.join(html_content.split())
+
+def format_timestamps(row: dict) -> dict:
+    # DB stores epoch milliseconds; the admin UI expects "YYYY-MM-DD HH:MM:SS[.ffffff]" in UTC
+    for field in ('created_at', 'updated_at'):
+        value = row.get(field)
+        if isinstance(value, int):
+            dt = datetime.datetime.fromtimestamp(value / 1000, datetime.timezone.utc)
+            row[field] = str(dt.replace(tzinfo=None))
+    return row
+
+@lru_cache(maxsize=1)
+def _signing_keys(version: int) -> Tuple[List[Tuple[Tuple[str, int], ...]], dict]:
+    # (key, user_id) pairs plus an index by key id, rebuilt only when users change.
+    # The pairs tuple sits in a one-item list so run_app can swap in a reordered copy.
+    key_map = {u['key']: u['id'] for u in list_users()}
+    # If DEFAULT_SECRET is not in DB users for some reason, we treat it as Admin (ID 1)
+    if DEFAULT_SECRET not in key_map:
+        key_map[DEFAULT_SECRET] = 1
+    all_keys = tuple(key_map.items())
+    keys_by_id = {}
+    for pair in all_keys:
+        keys_by_id.setdefault(key_id(pair[0]), []).append(pair)
+    return [all_keys], {kid: tuple(pairs) for kid, pairs in keys_by_id.items()}
+
+# Prepare the HMAC pad states for every known key up front, so the first
+# request signed with each key doesn't pay for it.
+for _key, _uid in _signing_keys(users_version())[0][0]:
+    _hmac_pads(_key)
+
+# Verified stateless links: (d, s, k) -> (user_id, html bytes). Hot shared links
+# skip HMAC and decompression entirely. Bounded by total bytes, dropped whenever
+# the users table changes.
+RESULT_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+class ResultCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.version = None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _clear(self):
+        self._data.clear()
+        self.size = 0
+
+    def get(self, key: tuple, version: int) -> Optional[Tuple[int, bytes]]:
+        with self._lock:
+            if version != self.version:
+                self._clear()
+                self.version = version
+                return None
+            item = self._data.get(key)
+            if item is not None:
+                self._data.move_to_end(key)
+            return item
+
+    def put(self, key: tuple, version: int, value: Tuple[int, bytes]):
+        cost = len(key[0]) + len(value[1])
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            if version != self.version:
+                return
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= len(key[0]) + len(old[1])
+            self._data[key] = value
+            self.size += cost
+            while self.size > self.max_bytes:
+                old_key, old_value = self._data.popitem(last=False)
+                self.size -= len(old_key[0]) + len(old_value[1])
+
+_result_cache = ResultCache(RESULT_CACHE_MAX_BYTES)
 
 # --- AUTH HELPER ---
 
@@ -139,86 +322,214 @@ def get_current_user_by_key(key: str):
     return user
 
 # --- ENDPOINTS ---
+# Endpoints that hit SQLite or do zlib/Brotli/HMAC work are plain `def`, so FastAPI
+# runs them in its threadpool instead of blocking the event loop.
+
+RUNNER_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+def _etag_matches(if_none_match: Optional[str], s: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        # `*` is deliberately not honoured: it would confirm a page the client never fetched
+        if tag.strip('"') == s:
+            return True
+    return False
+
+@lru_cache(maxsize=256)
+def _accepts_encoding(accept_encoding: Optional[str], coding: str) -> bool:
+    # Parses "br;q=0, gzip, *;q=0.5"-style lists: a coding is accepted if it (or `*`)
+    # is listed with a non-zero q-value. Browsers send a handful of distinct headers.
+    if not accept_encoding:
+        return False
+    wildcard = False
+    for item in accept_encoding.split(','):
+        name, _, params = item.partition(';')
+        name = name.strip().lower()
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name == coding:
+            return q > 0
+        if name == '*':
+            wildcard = q > 0
+    return wildcard
+
+def verify_signature(d: str, s: str, k: Optional[str] = None,
+                     version: Optional[int] = None) -> Tuple[str, int]:
+    """
+    Returns (key, user_id) of the key that signed `d`, or raises 403.
+    """
+    # A signature that can't be an encoded SHA-256 digest can't match any key; skip the HMAC work
+    if not _SIGNATURE_RE.fullmatch(s):
+        raise HTTPException(status_code=403, detail="Integrity Check Failed (Invalid Signature)")
+    if version is None:
+        version = users_version()
 
-@app.get("/", response_class=HTMLResponse)
-async def run_app(request: Request, d: str = None, s: str = None):
-    if not d or not s:
-        return templates.TemplateResponse(request=request, name="index.html")
-
-    users = list_users()
     matched_key = None
     matched_user_id = None
 
     # We need to find the specific user who owns the key for stats
-    # Optimization: Iterate users and check signature
-    # Also check DEFAULT_SECRET explicitly
-
-    # Check default secret first?
-    # If DEFAULT_SECRET is not in DB users for some reason, we treat it as Admin (ID 1)
-    # But sync_admin_key should handle it.
-
-    # Build map key->user_id
-    key_map = {u['key']: u['id'] for u in users}
-
-    # If DEFAULT_SECRET not in map (e.g. env var changed but sync not run yet/failed?)
-    if DEFAULT_SECRET not in key_map:
-        key_map[DEFAULT_SECRET] = 1
-
-    for key, uid in key_map.items():
-        expected_sign = sign_data(d, key)
-        if hmac.compare_digest(expected_sign, s):
+    key_order, keys_by_id = _signing_keys(version)
+    if k:
+        # Links that carry a key id only need one HMAC; links without it try every key
+        candidates = keys_by_id.get(k, ())
+    else:
+        candidates = key_order[0]
+
+    # Encode the payload and decode the signature once rather than once per candidate key;
+    # comparing raw digests also skips hexlifying every candidate
+    d_bytes = d.encode('utf-8')
+    s_bytes = decode_signature(s)
+    for i, (key, uid) in enumerate(candidates):
+        if hmac.compare_digest(sign_digest(d_bytes, key), s_bytes):
             matched_key = key
             matched_user_id = uid
+            if i and not k:
+                # Move to front: links without a key id mostly come from a few hot keys.
+                # A reordered copy is swapped in, so concurrent scans never see a partial swap.
+                key_order[0] = (candidates[i],) + candidates[:i] + candidates[i + 1:]
             break
 
     if not matched_key:
         raise HTTPException(status_code=403, detail="Integrity Check Failed (Invalid Signature)")
+    return matched_key, matched_user_id
+
+@app.get("/", response_class=HTMLResponse)
+def run_app(request: Request, d: str = None, s: str = None, k: Optional[str] = None):
+    if not d or not s:
+        return templates.TemplateResponse(request=request, name="index.html")
 
-    key_prefix = matched_key[:5] if len(matched_key) >= 5 else matched_key
-    logging.info(f"Access granted using key starting with: {key_prefix}")
+    # Only verified links get a 304 or a cached page: a result cache hit was verified when
+    # it was stored, anything else goes through verify_signature (which also rejects
+    # malformed signatures) before `s` is echoed in the ETag
+    cache_key = (d, s, k)
+    version = users_version()
+    cached = _result_cache.get(cache_key, version)
+    if cached is not None:
+        matched_user_id, html = cached
+    else:
+        matched_key, matched_user_id = verify_signature(d, s, k, version)
+        logging.info("Access granted using key starting with: %s", matched_key[:5])
+        html = None
 
-    # LOG STATS
+    # LOG STATS (revalidations count as views, as on the /p routes)
     if matched_user_id:
         log_action(matched_user_id, 'view_stateless')
 
-    try:
-        html_content = decompress_payload(d)
-        return html_content
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Decoding error: {str(e)}")
+    # The payload already is a Brotli (or zlib, i.e. HTTP "deflate") stream: clients that
+    # accept it get the decoded base64 as-is and decompress it themselves
+    encoding = _payload_encoding(d)
+    if encoding and not _accepts_encoding(request.headers.get('accept-encoding'), encoding):
+        encoding = None
+
+    # `s` is a digest of `d`, so the same link always renders the same page; each
+    # content coding is its own representation and gets its own ETag
+    etag = f'{s}-{encoding}' if encoding else s
+    cache_headers = {'ETag': f'"{etag}"', 'Cache-Control': RUNNER_CACHE_CONTROL, 'Vary': 'Accept-Encoding'}
+    if _etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=cache_headers)
+
+    if html is None:
+        # Every payload is fully decompressed within MAX_HTML_BYTES before any header goes
+        # out, so a 413/400 is never replaced by a truncated page under immutable caching.
+        # Typical payloads fit in one chunk and are cached; larger ones are checked chunk by
+        # chunk and then decompressed again while streaming, so the whole document is never
+        # held in memory.
+        try:
+            chunks = iter_decompressed_payload(d)
+            first = next(chunks)
+            second = next(chunks, None)
+            if second is not None:
+                for _ in chunks:
+                    pass
+        except PayloadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Decoding error: {str(e)}")
+
+        if second is None:
+            html = first
+            _result_cache.put(cache_key, version, (matched_user_id, html))
+        elif not encoding:
+            return StreamingResponse(iter_decompressed_payload(d), media_type="text/html",
+                                     headers=cache_headers)
+
+    if encoding:
+        return HTMLResponse(content=_decode_payload(d)[1],
+                            headers={**cache_headers, 'Content-Encoding': encoding})
+    return HTMLResponse(content=html, headers=cache_headers)
+
+# Persistent apps change only on save/delete: rendered bytes are cached per apps_version(),
+# together with a hash of them that serves as the ETag, so repeat visitors get a 304.
+PERSISTENT_CACHE_CONTROL = 'no-cache'
+_persistent_cache = ResultCache(RESULT_CACHE_MAX_BYTES)
+
+def _serve_persistent_app(request: Request, slug: str, user_id: int) -> Response:
+    cache_key = (slug, user_id)
+    version = apps_version()
+    cached = _persistent_cache.get(cache_key, version)
+    if cached is None:
+        app_data = get_app(slug, user_id=user_id)
+        if not app_data:
+            raise HTTPException(status_code=404, detail="App not found")
+        html = app_data['html_content'].encode('utf-8')
+        # Hash the content rather than use updated_at: timestamps can repeat (same
+        # millisecond, clock steps back) and are NULL on some migrated rows
+        cached = (hashlib.blake2b(html, digest_size=8).hexdigest(), html)
+        _persistent_cache.put(cache_key, version, cached)
+    etag, html = cached
+
+    # LOG STATS (revalidations count as views, as on the stateless runner)
+    log_action(user_id, 'view_persistent', slug=slug)
+
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': PERSISTENT_CACHE_CONTROL}
+    if _etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(content=html, headers=headers)
 
 # Admin / Legacy routes
 @app.get("/p/{slug}", response_class=HTMLResponse)
-async def run_persistent_app_admin(slug: str):
-    app_data = get_app(slug, user_id=1)
-    if not app_data:
-        raise HTTPException(status_code=404, detail="App not found")
-
-    # LOG STATS
-    log_action(1, 'view_persistent', slug=slug)
-
-    return HTMLResponse(content=app_data['html_content'])
+def run_persistent_app_admin(request: Request, slug: str):
+    return _serve_persistent_app(request, slug, 1)
 
 # User routes
 @app.get("/p{user_id}/{slug}", response_class=HTMLResponse)
-async def run_persistent_app_user(user_id: int, slug: str):
-    app_data = get_app(slug, user_id=user_id)
-    if not app_data:
-        raise HTTPException(status_code=404, detail="App not found")
-
-    # LOG STATS
-    log_action(user_id, 'view_persistent', slug=slug)
-
-    return HTMLResponse(content=app_data['html_content'])
+def run_persistent_app_user(request: Request, user_id: int, slug: str):
+    return _serve_persistent_app(request, slug, user_id)
 
 # --- ADMIN PANEL ---
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
 
+# admin.html has no per-request context, so it is rendered, encoded and gzipped once
+_ADMIN_HTML = templates.get_template("admin.html").render().encode('utf-8')
+_ADMIN_GZIP = gzip.compress(_ADMIN_HTML, compresslevel=9)
+_ADMIN_ETAG = hashlib.sha256(_ADMIN_HTML).hexdigest()[:16]
+# Each coding is a different representation, so it gets its own ETag
+_ADMIN_GZIP_ETAG = f'{_ADMIN_ETAG}-gzip'
+# Revalidate on every load so a redeploy is picked up; unchanged pages cost a 304
+_ADMIN_HEADERS = {'ETag': f'"{_ADMIN_ETAG}"', 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+_ADMIN_GZIP_HEADERS = {**_ADMIN_HEADERS, 'ETag': f'"{_ADMIN_GZIP_ETAG}"'}
+
 @app.get("/admin", response_class=HTMLResponse)
 async def admin_page(request: Request):
-    return templates.TemplateResponse(request=request, name="admin.html")
+    if _accepts_encoding(request.headers.get('accept-encoding'), 'gzip'):
+        if _etag_matches(request.headers.get('if-none-match'), _ADMIN_GZIP_ETAG):
+            return Response(status_code=304, headers=_ADMIN_GZIP_HEADERS)
+        return HTMLResponse(content=_ADMIN_GZIP, headers={**_ADMIN_GZIP_HEADERS, 'Content-Encoding': 'gzip'})
+    if _etag_matches(request.headers.get('if-none-match'), _ADMIN_ETAG):
+        return Response(status_code=304, headers=_ADMIN_HEADERS)
+    return HTMLResponse(content=_ADMIN_HTML, headers=_ADMIN_HEADERS)
 
 class GenerateRequest(BaseModel):
     domain: Optional[str] = None
@@ -226,8 +537,7 @@ class GenerateRequest(BaseModel):
     html: str
     compress: bool = False
 
-@app.post("/api/generate")
-async def generate_api(req: GenerateRequest):
+def _generate_link(req: GenerateRequest) -> JSONResponse:
     user = get_current_user_by_key(req.key)
 
     html_to_process = req.html
@@ -237,15 +547,27 @@ async def generate_api(req: GenerateRequest):
     payload = compress_payload(html_to_process)
     signature = sign_data(payload, req.key)
 
-    domain = req.domain if req.domain else DEFAULT_DOMAIN
-    domain = domain.rstrip('/')
-
-    full_url = f"{domain}/?d={payload}&s={signature}"
+    prefix = req.domain.rstrip('/') + '/?d=' if req.domain else _DEFAULT_URL_PREFIX
+    full_url = prefix + payload + '&s=' + signature + '&k=' + key_id(req.key)
 
     # LOG STATS
     log_action(user['id'], 'generate')
 
-    return {"url": full_url}
+    # Already JSON-safe: skip FastAPI's jsonable_encoder walk
+    return JSONResponse({"url": full_url})
+
+@app.post("/api/generate", openapi_extra={"requestBody": {
+    "required": True,
+    "content": {"application/json": {"schema": GenerateRequest.model_json_schema()}},
+}})
+async def generate_api(request: Request):
+    # The html field can be megabytes of escaped text: parse and validate it in one pass
+    # with pydantic's JSON parser instead of json.loads() followed by validation
+    try:
+        req = GenerateRequest.model_validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in e.errors()])
+    return await run_in_threadpool(_generate_link, req)
 
 # --- PERSISTENT APPS API ---
 
@@ -260,7 +582,7 @@ class DeleteAppRequest(BaseModel):
     owner_id: Optional[int] = None # Support deleting for other users (Admin only)
 
 @app.post("/api/apps")
-async def save_app_api(req: SaveAppRequest):
+def save_app_api(req: SaveAppRequest):
     user = get_current_user_by_key(req.key)
 
     target_user_id = user['id']
@@ -276,20 +598,20 @@ async def save_app_api(req: SaveAppRequest):
     return {"status": "ok", "slug": req.slug, "user_id": target_user_id}
 
 @app.get("/api/apps")
-async def list_apps_api(key: str):
+def list_apps_api(key: str, limit: Optional[int] = None, offset: int = 0):
     user = get_current_user_by_key(key)
 
     if user['id'] == 1:
         # Admin sees all apps
-        apps = list_apps(user_id=None)
+        apps = list_apps(user_id=None, limit=limit, offset=offset)
     else:
         # User sees only theirs
-        apps = list_apps(user_id=user['id'])
+        apps = list_apps(user_id=user['id'], limit=limit, offset=offset)
 
-    return apps
+    return [format_timestamps(a) for a in apps]
 
 @app.get("/api/apps/{slug}")
-async def get_app_api(slug: str, key: str, target_user_id: Optional[int] = None):
+def get_app_api(slug: str, key: str, target_user_id: Optional[int] = None):
     user = get_current_user_by_key(key)
 
     uid = user['id']
@@ -301,10 +623,10 @@ async def get_app_api(slug: str, key: str, target_user_id: Optional[int] = None)
     app_data = get_app(slug, user_id=uid)
     if not app_data:
         raise HTTPException(status_code=404, detail="App not found")
-    return app_data
+    return format_timestamps(app_data)
 
 @app.delete("/api/apps/{slug}")
-async def delete_app_api(slug: str, req: DeleteAppRequest, target_user_id: Optional[int] = None):
+def delete_app_api(slug: str, req: DeleteAppRequest, target_user_id: Optional[int] = None):
     user = get_current_user_by_key(req.key)
 
     uid = user['id']
@@ -328,19 +650,19 @@ class CreateUserRequest(BaseModel):
     admin_key: str
 
 @app.post("/api/users")
-async def create_user_api(req: CreateUserRequest):
+def create_user_api(req: CreateUserRequest):
     admin = get_current_user_by_key(req.admin_key)
     if admin['id'] != 1:
         raise HTTPException(status_code=403, detail="Only Admin can create users")
 
     try:
-        new_id = create_user(req.key, req.comment)
-        return {"id": new_id, "key": req.key}
+        new_user = create_user(req.key, req.comment)
+        return {"id": new_user["id"], "key": new_user["key"]}
     except ValueError:
         raise HTTPException(status_code=400, detail="Key already exists")
 
 @app.get("/api/users")
-async def list_users_api(key: str):
+def list_users_api(key: str):
     user = get_current_user_by_key(key)
     if user['id'] != 1:
         raise HTTPException(status_code=403, detail="Only Admin can list users")
@@ -350,6 +672,7 @@ async def list_users_api(key: str):
 
     # Merge stats into users
     for u in users:
+        format_timestamps(u)
         uid = u['id']
         if uid in stats:
             u['stats'] = stats[uid]
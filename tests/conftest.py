@@ -1,14 +1,46 @@
-import sys
-import os
+import uuid
+
+import httpx
 import pytest
-from pathlib import Path
 
-# Add app directory to path so tests can import from app modules
-app_dir = Path(__file__).parent.parent / "app"
-sys.path.insert(0, str(app_dir))
+from fastapi.testclient import TestClient
 
 import db
-from main import DEFAULT_SECRET
+from main import app, DEFAULT_SECRET
+
+@pytest.fixture(scope="session")
+def client():
+    """
+    One TestClient (and one app lifespan) shared by the whole session.
+    """
+    with TestClient(app) as c:
+        yield c
+
+@pytest.fixture
+def anyio_backend():
+    # anyio's pytest plugin runs `pytest.mark.anyio` tests; asyncio is the only backend we serve on
+    return "asyncio"
+
+@pytest.fixture
+async def async_client():
+    """
+    AsyncClient bound straight to the app, for tests that make a sequence of requests
+    on the test's own event loop instead of going through TestClient's portal thread.
+    """
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+
+@pytest.fixture
+def make_user():
+    """
+    Factory that creates users straight in the DB: make_user(comment, key=None) -> (key, user_id).
+    Tests that exercise POST /api/users itself should keep going through the client.
+    """
+    def _make_user(comment: str = "Test User", key: str = None):
+        key = key or f"mini{uuid.uuid4()}"
+        return key, db.create_user(key, comment)["id"]
+    return _make_user
 
 @pytest.fixture(autouse=True)
 def test_db(monkeypatch, tmp_path):
@@ -28,3 +60,6 @@ def test_db(monkeypatch, tmp_path):
     db.sync_admin_key(DEFAULT_SECRET)
 
     yield
+
+    # Don't let queued access logs leak into the next test's database
+    db.flush_logs()
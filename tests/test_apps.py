@@ -1,10 +1,8 @@
 import pytest
-from fastapi.testclient import TestClient
-from main import app, DEFAULT_SECRET
+from main import DEFAULT_SECRET
 import db
 import uuid
 
-client = TestClient(app)
 TEST_KEY = DEFAULT_SECRET
 
 def test_db_operations():
@@ -38,7 +36,7 @@ def test_db_operations():
     db.delete_app(slug)
     assert db.get_app(slug) is None
 
-def test_api_save_app():
+def test_api_save_app(client):
     """Test POST /api/apps"""
     slug = "api-test"
     html = "<p>API Content</p>"
@@ -57,7 +55,7 @@ def test_api_save_app():
     app_data = db.get_app(slug)
     assert app_data["html_content"] == html
 
-def test_api_save_app_invalid_key():
+def test_api_save_app_invalid_key(client):
     """Test POST /api/apps with invalid key"""
     response = client.post("/api/apps", json={
         "key": "invalid-key",
@@ -66,7 +64,7 @@ def test_api_save_app_invalid_key():
     })
     assert response.status_code == 403
 
-def test_api_list_apps():
+def test_api_list_apps(client):
     """Test GET /api/apps"""
     # Create a couple of apps
     db.save_app("app1", "c1")
@@ -77,7 +75,7 @@ def test_api_list_apps():
     slugs = [item["slug"] for item in data]
     assert "app1" in slugs
 
-def test_api_get_app():
+def test_api_get_app(client):
     """Test GET /api/apps/{slug}"""
     slug = "get-test"
     db.save_app(slug, "content")
@@ -87,7 +85,7 @@ def test_api_get_app():
     assert response.json()["slug"] == slug
     assert response.json()["html_content"] == "content"
 
-def test_api_delete_app():
+def test_api_delete_app(client):
     """Test DELETE /api/apps/{slug}"""
     slug = "del-test"
     db.save_app(slug, "content")
@@ -98,7 +96,7 @@ def test_api_delete_app():
 
     assert db.get_app(slug) is None
 
-def test_isolation_and_routing():
+def test_isolation_and_routing(client):
     # 1. Create User
     ukey = f"mini{uuid.uuid4()}"
     resp = client.post("/api/users", json={
@@ -135,15 +133,9 @@ def test_isolation_and_routing():
     resp = client.get(f"/api/apps/game?key={ukey}")
     assert resp.json()['html_content'] == "User Game"
 
-def test_admin_management_safety():
-    # 1. Create User
-    ukey = f"mini{uuid.uuid4()}"
-    resp = client.post("/api/users", json={
-        "admin_key": TEST_KEY,
-        "key": ukey,
-        "comment": "User 3"
-    })
-    uid = resp.json()['id']
+def test_admin_management_safety(client, make_user):
+    # 1. Create User (POST /api/users itself is covered by test_isolation_and_routing)
+    ukey, uid = make_user("User 3")
 
     # 2. User 3 saves "tool"
     client.post("/api/apps", json={"key": ukey, "slug": "tool", "html": "User Tool"})
@@ -186,3 +178,39 @@ def test_admin_management_safety():
     resp = client.get(f"/api/apps/tool?key={TEST_KEY}&target_user_id={uid}")
     assert resp.status_code == 200
     assert resp.json()['html_content'] == "Admin Created for User 3"
+
+
+def test_persistent_app_etag_and_cache_invalidation(client):
+    client.post("/api/apps", json={"key": TEST_KEY, "slug": "etag-app", "html": "<p>v1</p>"})
+
+    response = client.get("/p/etag-app")
+    assert response.status_code == 200
+    assert response.text == "<p>v1</p>"
+    etag = response.headers["etag"]
+
+    assert client.get("/p/etag-app", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/p/etag-app", headers={"If-None-Match": "*"}).status_code == 200
+    # Both loads and the revalidation count, same as stateless views
+    assert db.get_user_stats(1)["view_persistent"] == 3
+
+    # Saving again changes both the content and the ETag
+    client.post("/api/apps", json={"key": TEST_KEY, "slug": "etag-app", "html": "<p>v2</p>"})
+    response = client.get("/p/etag-app", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.text == "<p>v2</p>"
+
+    client.request("DELETE", "/api/apps/etag-app", json={"key": TEST_KEY})
+    assert client.get("/p/etag-app").status_code == 404
+
+
+def test_persistent_app_etag_follows_content_not_timestamp(client, monkeypatch):
+    # Two saves in the same millisecond must still produce different ETags
+    monkeypatch.setattr(db, "_now_ms", lambda: 1700000000000)
+    db.save_app("same-ms", "<p>v1</p>")
+    etag = client.get("/p/same-ms").headers["etag"]
+
+    db.save_app("same-ms", "<p>v2</p>")
+    response = client.get("/p/same-ms", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.text == "<p>v2</p>"
+    assert response.headers["etag"] != etag
@@ -1,10 +1,7 @@
-
 import pytest
 import re
-from fastapi.testclient import TestClient
-from main import app, minify_html, DEFAULT_SECRET
+from main import minify_html, DEFAULT_SECRET
 
-client = TestClient(app)
 
 def test_minify_html_comments():
     html = """
@@ -83,7 +80,7 @@ def test_minify_html_whitespace():
     # It collapses whitespace to single space
     assert "<div> <p> Hello World </p> </div>" == minified
 
-def test_generate_api_with_compression():
+def test_generate_api_with_compression(client):
     valid_key = DEFAULT_SECRET
 
     html = """
@@ -116,3 +113,16 @@ def test_generate_api_with_compression():
 
     # The compressed URL should likely be shorter or at least different
     assert len(url_compressed) < len(url_no_compress)
+
+def test_remove_js_comments_edge_cases():
+    from main import remove_js_comments
+
+    # Even run of backslashes closes the string; the comment after it goes
+    assert remove_js_comments('var a = "x\\\\\\\\"; // c') == 'var a = "x\\\\\\\\"; '
+    # Odd run escapes the quote, so the string (and the "comment") continues
+    assert remove_js_comments('var a = "x\\\\\\" // not c";') == 'var a = "x\\\\\\" // not c";'
+    # Template literals and unterminated strings are kept verbatim
+    assert remove_js_comments('`a // b`\n// c\nx') == '`a // b`\n\nx'
+    assert remove_js_comments("'open // forever") == "'open // forever"
+    # Block comments are left to the CSS/HTML passes; division is untouched
+    assert remove_js_comments("a = b / c; /* keep */") == "a = b / c; /* keep */"
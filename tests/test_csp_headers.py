@@ -1,9 +1,4 @@
-from fastapi.testclient import TestClient
-from main import app
-
-client = TestClient(app)
-
-def test_security_headers_system_routes():
+def test_security_headers_system_routes(client):
     # Strict headers for system pages
     paths = ["/", "/admin"]
     for path in paths:
@@ -23,7 +18,7 @@ def test_security_headers_system_routes():
         assert response.headers["X-Content-Type-Options"] == "nosniff"
         assert response.headers["Referrer-Policy"] == "strict-origin-when-cross-origin"
 
-def test_security_headers_runner_routes():
+def test_security_headers_runner_routes(client):
     # Permissive headers for runner routes
     # Mocking a signed URL (signature doesn't matter for middleware path logic, but let's be realistic)
     response = client.get("/?d=payload&s=signature")
@@ -40,7 +35,7 @@ def test_security_headers_runner_routes():
     # X-Frame-Options should NOT be SAMEORIGIN (it might be absent or different)
     assert response.headers.get("X-Frame-Options") != "SAMEORIGIN"
 
-def test_security_headers_persistent_routes():
+def test_security_headers_persistent_routes(client):
     # Permissive headers for /p routes
     response = client.get("/p/some-slug")
     # Will be 404 if not found, but middleware still applies
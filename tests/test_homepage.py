@@ -1,9 +1,4 @@
-from fastapi.testclient import TestClient
-from main import app
-
-client = TestClient(app)
-
-def test_homepage_structure():
+def test_homepage_structure(client):
     response = client.get("/")
     assert response.status_code == 200
 
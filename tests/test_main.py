@@ -1,18 +1,30 @@
-from fastapi.testclient import TestClient
-from main import app, DEFAULT_SECRET
+import base64
+import hashlib
+import hmac
+import zlib
 
-client = TestClient(app)
+import pytest
+from fastapi import HTTPException
 
-def test_admin_page():
+import db
+import main
+from main import (
+    DEFAULT_SECRET, STREAM_CHUNK_SIZE, ResultCache, _accepts_encoding, compress_payload,
+    decode_signature, decompress_payload, key_id, sign_data, sign_digest, verify_signature,
+)
+
+
+def test_admin_page(client):
     response = client.get("/admin")
     assert response.status_code == 200
     assert "Генератор ссылок" in response.text
 
-def test_generation_and_execution_flow():
+@pytest.mark.anyio
+async def test_generation_and_execution_flow(async_client):
     html_source = "<h1>Hello Test</h1>"
 
     # 1. Генерируем ссылку через API
-    gen_response = client.post("/api/generate", json={
+    gen_response = await async_client.post("/api/generate", json={
         "domain": "",
         "key": DEFAULT_SECRET,
         "html": html_source
@@ -22,32 +34,335 @@ def test_generation_and_execution_flow():
 
     # Парсим параметры из URL (имитация)
     # url будет вида /?d=...&s=...
-    query_string = url.split("?")[1]
+    query_string = url.partition("?")[2]
 
     # 2. Пытаемся открыть "страницу"
-    run_response = client.get(f"/?{query_string}")
+    run_response = await async_client.get(f"/?{query_string}")
 
     assert run_response.status_code == 200
     assert run_response.text == html_source
     assert run_response.headers["content-type"] == "text/html; charset=utf-8"
 
+    stats = db.get_users_stats()[1]
+    assert stats["generated"] == 1
+    assert stats["view_stateless"] == 1
+
 def test_bad_signature():
     # Берем валидный payload, но ломаем подпись
-    response = client.get("/?d=SGVsbG8=&s=FAKE_SIGNATURE")
-    assert response.status_code == 403
-    assert "Integrity Check Failed" in response.json()["detail"]
+    # Проверяем саму проверку подписи, без HTTP-слоя (end-to-end см. test_malformed_signature_rejected_before_hmac)
+    with pytest.raises(HTTPException) as exc:
+        verify_signature("SGVsbG8=", "FAKE_SIGNATURE")
+    assert exc.value.status_code == 403
+    assert "Integrity Check Failed" in exc.value.detail
+
+    assert verify_signature("SGVsbG8", sign_data("SGVsbG8", DEFAULT_SECRET)) == (DEFAULT_SECRET, 1)
 
 def test_garbage_data():
     # Берем валидную подпись (технически), но мусор вместо данных (сложно сделать без ключа, но допустим)
     # Проще просто отправить мусор
-    response = client.get("/?d=NOT_BASE64&s=123")
     # Тут либо 403 (подпись не сойдется), либо 400 (декод упадет)
     # Скорее всего 403, так как HMAC считается от d.
-    assert response.status_code == 403
+    with pytest.raises(HTTPException) as exc:
+        verify_signature("NOT_BASE64", "123")
+    assert exc.value.status_code == 403
 
+    # Well-formed but wrong signature
+    with pytest.raises(HTTPException) as exc:
+        verify_signature("NOT_BASE64", "0" * 64)
+    assert exc.value.status_code == 403
 
-def test_admin_ui_does_not_force_mini_prefix_for_new_user_key():
+
+def test_admin_ui_does_not_force_mini_prefix_for_new_user_key(client):
     response = client.get("/admin")
     assert response.status_code == 200
     # User-provided key should be sent as-is, without forced "mini" prefix.
     assert 'const fullKey = "mini" + uuidPart;' not in response.text
+
+
+def test_sign_data_matches_plain_hmac():
+    for key in ("some-key", "k" * 64, "long-" * 20):
+        for data in ("abc", "abc", "другое"):
+            expected = hmac.new(key.encode("utf-8"), data.encode("utf-8"), hashlib.sha256).digest()
+            signature = sign_data(data, key)
+            assert len(signature) == 43
+            assert decode_signature(signature) == expected
+
+
+def test_payload_roundtrip_and_legacy_zlib_links():
+    html = "<h1>Привет</h1>" * 20
+    payload = compress_payload(html)
+    assert payload.startswith("b")
+    assert decompress_payload(payload) == html
+
+    # Links generated before the Brotli switch are plain zlib
+    legacy = base64.urlsafe_b64encode(zlib.compress(html.encode("utf-8"), level=9)).decode().rstrip("=")
+    assert decompress_payload(legacy) == html
+
+
+def test_tiny_pages_are_stored_uncompressed(client):
+    payload = compress_payload("<b>hi</b>")
+    assert payload.startswith("r")
+    assert decompress_payload(payload) == "<b>hi</b>"
+
+    response = client.get(f"/?d={payload}&s={sign_data(payload, DEFAULT_SECRET)}")
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert response.text == "<b>hi</b>"
+
+
+def test_malformed_signature_rejected_before_hmac(client, monkeypatch):
+    calls = []
+    monkeypatch.setattr(main, "sign_digest", lambda *a: calls.append(a) or b"")
+
+    for s in ("x" * 64, "ab" * 31, "AB" * 32):
+        response = client.get(f"/?d=SGVsbG8&s={s}")
+        assert response.status_code == 403
+        assert "Integrity Check Failed" in response.json()["detail"]
+    assert calls == []
+
+
+def test_large_payload_is_streamed_intact(client):
+    html = "".join(f"<p>row {i}</p>" for i in range(STREAM_CHUNK_SIZE // 4))
+    payload = compress_payload(html)
+    response = client.get(f"/?d={payload}&s={sign_data(payload, DEFAULT_SECRET)}",
+                          headers={"Accept-Encoding": "identity"})
+
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert response.text == html
+    assert response.headers["content-type"] == "text/html; charset=utf-8"
+
+
+def test_key_id_selects_signing_key(client, monkeypatch):
+    payload = compress_payload("<p>kid</p>")
+    sig = sign_data(payload, DEFAULT_SECRET)
+
+    tried = []
+    real_sign = main.sign_digest
+    monkeypatch.setattr(main, "sign_digest", lambda data, key: tried.append(key) or real_sign(data, key))
+
+    response = client.get(f"/?d={payload}&s={sig}&k={key_id(DEFAULT_SECRET)}")
+    assert response.status_code == 200
+    assert tried == [DEFAULT_SECRET]
+
+    # A wrong key id must not fall back to other keys
+    response = client.get(f"/?d={payload}&s={sig}&k=00000000")
+    assert response.status_code == 403
+
+    # Old links without k still work
+    response = client.get(f"/?d={payload}&s={sig}")
+    assert response.status_code == 200
+
+
+def test_repeated_link_served_from_result_cache(client, monkeypatch):
+    payload = compress_payload("<p>hot link</p>")
+    sig = sign_data(payload, DEFAULT_SECRET)
+    identity = {"Accept-Encoding": "identity"}
+    assert client.get(f"/?d={payload}&s={sig}", headers=identity).status_code == 200
+
+    monkeypatch.setattr(main, "sign_digest", lambda *a: b"")
+    response = client.get(f"/?d={payload}&s={sig}", headers=identity)
+    assert response.status_code == 200
+    assert response.text == "<p>hot link</p>"
+
+    # Cached hits are still counted as views
+    assert db.get_users_stats()[1]["view_stateless"] == 2
+
+
+def test_result_cache_is_bounded_by_bytes():
+    cache = ResultCache(max_bytes=100)
+    assert cache.get(("a", "s", None), 1) is None
+    cache.put(("a", "s", None), 1, (1, b"x" * 40))
+    cache.put(("b", "s", None), 1, (1, b"x" * 40))
+    cache.put(("c", "s", None), 1, (1, b"x" * 40))
+
+    assert cache.get(("a", "s", None), 1) is None
+    assert cache.get(("c", "s", None), 1) == (1, b"x" * 40)
+    assert cache.size <= 100
+    # A users change invalidates everything
+    assert cache.get(("c", "s", None), 2) is None
+
+
+def test_runner_etag_short_circuits_repeat_loads(client):
+    payload = compress_payload("<p>etag</p>")
+    sig = sign_data(payload, DEFAULT_SECRET)
+    response = client.get(f"/?d={payload}&s={sig}")
+    assert response.status_code == 200
+    assert response.headers["etag"] == f'"{sig}"'
+    assert "immutable" in response.headers["cache-control"]
+
+    response = client.get(f"/?d={payload}&s={sig}", headers={"If-None-Match": f'W/"{sig}"'})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == f'"{sig}"'
+
+    response = client.get(f"/?d={payload}&s={sig}", headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+
+    # Revalidations are views too
+    assert db.get_user_stats(1)["view_stateless"] == 3
+
+
+def test_runner_304_requires_a_valid_signature(client):
+    payload = compress_payload("<p>etag</p>")
+    forged = "A" * 43
+    for tag in ("*", f'"{forged}"'):
+        response = client.get(f"/?d={payload}&s={forged}", headers={"If-None-Match": tag})
+        assert response.status_code == 403
+
+    # `*` never short-circuits, even for a genuine link
+    sig = sign_data(payload, DEFAULT_SECRET)
+    response = client.get(f"/?d={payload}&s={sig}", headers={"If-None-Match": "*"})
+    assert response.status_code == 200
+
+
+def test_signing_keys_are_not_reloaded_per_request(client, make_user, monkeypatch):
+    user_key, _ = make_user("cache")
+    payload = compress_payload("<p>one</p>")
+    assert client.get(f"/?d={payload}&s={sign_data(payload, user_key)}").status_code == 200
+
+    # Until the users table changes, verification doesn't go back to the database
+    monkeypatch.setattr(main, "list_users", lambda: [])
+    payload = compress_payload("<p>two</p>")
+    response = client.get(f"/?d={payload}&s={sign_data(payload, user_key)}")
+    assert response.status_code == 200
+    assert response.text == "<p>two</p>"
+
+
+def test_decompression_is_bounded(client, monkeypatch):
+    bomb = compress_payload(" " * (main.STREAM_CHUNK_SIZE * 4))
+    monkeypatch.setattr(main, "MAX_HTML_BYTES", main.STREAM_CHUNK_SIZE)
+    with pytest.raises(ValueError, match="too large"):
+        decompress_payload(bomb)
+
+    response = client.get(f"/?d={bomb}&s={sign_data(bomb, DEFAULT_SECRET)}",
+                          headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 413
+    assert "too large" in response.json()["detail"]
+
+    # Crossing the limit after the first two chunks is still a 413, not a cut-off 200
+    monkeypatch.setattr(main, "MAX_HTML_BYTES", main.STREAM_CHUNK_SIZE * 3)
+    big = compress_payload(" " * (main.STREAM_CHUNK_SIZE * 6))
+    response = client.get(f"/?d={big}&s={sign_data(big, DEFAULT_SECRET)}",
+                          headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 413
+    assert "immutable" not in response.headers.get("cache-control", "")
+
+
+def test_late_corruption_is_rejected_before_streaming(client):
+    # Decodes fine for well past two chunks, then the stream ends early
+    page = compress_payload("<p>late</p>" * (main.STREAM_CHUNK_SIZE // 2))
+    truncated = page[:-8]
+    response = client.get(f"/?d={truncated}&s={sign_data(truncated, DEFAULT_SECRET)}",
+                          headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 400
+    assert "etag" not in response.headers
+
+
+def test_generate_rejects_invalid_body(client):
+    response = client.post("/api/generate", json={"key": DEFAULT_SECRET})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "html"]
+
+    response = client.post("/api/generate", content=b"{not json", headers={"Content-Type": "application/json"})
+    assert response.status_code == 422
+
+
+def test_legacy_hex_signatures_still_verify(client):
+    payload = compress_payload("<p>hex</p>")
+    digest = sign_digest(payload, DEFAULT_SECRET)
+    response = client.get(f"/?d={payload}&s={digest.hex()}")
+    assert response.status_code == 200
+    assert response.text == "<p>hex</p>"
+
+
+def test_admin_page_is_served_precompressed_and_revalidated(client):
+    response = client.get("/admin", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "<html" in response.text.lower()
+
+    plain = client.get("/admin", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.text == response.text
+
+    # gzip;q=0 is a refusal, not a match on the substring
+    refused = client.get("/admin", headers={"Accept-Encoding": "gzip;q=0, br"})
+    assert "content-encoding" not in refused.headers
+
+    # The two codings are separate representations with separate ETags
+    etag = response.headers["etag"]
+    assert etag != plain.headers["etag"]
+    assert client.get("/admin", headers={"Accept-Encoding": "gzip", "If-None-Match": etag}).status_code == 304
+    response = client.get("/admin", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_accepts_encoding_honours_q_values():
+    assert _accepts_encoding("gzip, deflate, br", "br")
+    assert _accepts_encoding("BR;q=0.5", "br")
+    assert not _accepts_encoding("br;q=0, gzip", "br")
+    assert not _accepts_encoding("gzip", "br")
+    assert _accepts_encoding("*", "br")
+    assert not _accepts_encoding("*;q=0", "br")
+    assert not _accepts_encoding("br;q=0, *", "br")
+    assert not _accepts_encoding(None, "br")
+
+
+def test_legacy_links_move_matched_key_to_front(client, make_user, monkeypatch):
+    user_key, _ = make_user("mtf")
+    payload = compress_payload("<p>mtf</p>")
+    assert client.get(f"/?d={payload}&s={sign_data(payload, user_key)}").status_code == 200
+
+    payload = compress_payload("<p>mtf again</p>")
+    sig = sign_data(payload, user_key)
+    tried = []
+    real_sign = main.sign_digest
+    monkeypatch.setattr(main, "sign_digest", lambda data, key: tried.append(key) or real_sign(data, key))
+    assert client.get(f"/?d={payload}&s={sig}").status_code == 200
+    assert tried == [user_key]
+
+
+def test_compressed_payload_is_passed_through_to_capable_clients(client, monkeypatch):
+    html = "<p>passthrough</p>" * 10
+    payload = compress_payload(html)
+    sig = sign_data(payload, DEFAULT_SECRET)
+    response = client.get(f"/?d={payload}&s={sig}", headers={"Accept-Encoding": "gzip, br"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "br"
+    assert response.headers["etag"] == f'"{sig}-br"'
+    assert response.text == html
+
+    # The payload was validated once; repeat loads pass it through without decompressing
+    monkeypatch.setattr(main, "iter_decompressed_payload", None)
+    response = client.get(f"/?d={payload}&s={sig}", headers={"Accept-Encoding": "br"})
+    assert response.headers["content-encoding"] == "br"
+    assert response.text == html
+
+    # q=0 refuses the coding; the decoded page has its own ETag
+    response = client.get(f"/?d={payload}&s={sig}", headers={"Accept-Encoding": "br;q=0, gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == f'"{sig}"'
+    assert response.text == html
+    monkeypatch.undo()
+
+    legacy = base64.urlsafe_b64encode(zlib.compress(b"<p>legacy</p>")).decode().rstrip("=")
+    response = client.get(f"/?d={legacy}&s={sign_data(legacy, DEFAULT_SECRET)}",
+                          headers={"Accept-Encoding": "deflate"})
+    assert response.headers["content-encoding"] == "deflate"
+    assert response.text == "<p>legacy</p>"
+
+
+def test_passthrough_rejects_broken_and_oversized_payloads(client, monkeypatch):
+    payload = compress_payload("<p>truncated</p>" * 50)
+    truncated = payload[:len(payload) // 2]
+    for accept in ("br", "identity"):
+        response = client.get(f"/?d={truncated}&s={sign_data(truncated, DEFAULT_SECRET)}",
+                              headers={"Accept-Encoding": accept})
+        assert response.status_code == 400
+
+    bomb = compress_payload(" " * (main.STREAM_CHUNK_SIZE * 4))
+    monkeypatch.setattr(main, "MAX_HTML_BYTES", main.STREAM_CHUNK_SIZE)
+    response = client.get(f"/?d={bomb}&s={sign_data(bomb, DEFAULT_SECRET)}",
+                          headers={"Accept-Encoding": "br"})
+    assert response.status_code == 413
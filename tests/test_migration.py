@@ -1,54 +1,49 @@
 import sqlite3
-from datetime import datetime
 
 import db
 
 
-def test_init_db_recovers_when_legacy_admin_key_taken_by_another_user():
-    db_file = db.DB_PATH
+def _connect():
+    # Raw connection to the per-test DB file (see conftest.test_db); it is thrown
+    # away after the test, so skip the fsyncs on setup writes
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute("PRAGMA synchronous=OFF")
+    return conn
 
-    conn = sqlite3.connect(db_file)
-    c = conn.cursor()
-    c.execute("DROP TABLE IF EXISTS access_logs")
-    c.execute("DROP TABLE IF EXISTS apps")
-    c.execute("DROP TABLE IF EXISTS apps_old")
-    c.execute("DROP TABLE IF EXISTS users")
 
-    c.execute(
+def test_init_db_recovers_when_legacy_admin_key_taken_by_another_user():
+    conn = _connect()
+    conn.executescript(
         """
+        BEGIN;
+        DROP TABLE IF EXISTS access_logs;
+        DROP TABLE IF EXISTS apps;
+        DROP TABLE IF EXISTS apps_old;
+        DROP TABLE IF EXISTS users;
         CREATE TABLE users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             key TEXT UNIQUE NOT NULL,
             comment TEXT,
             created_at TIMESTAMP
-        )
-        """
-    )
-    c.execute(
-        """
+        );
         CREATE TABLE apps_old (
             slug TEXT PRIMARY KEY,
             html_content TEXT,
             created_at TIMESTAMP,
             updated_at TIMESTAMP
-        )
+        );
+        INSERT INTO users (id, key, comment, created_at)
+            VALUES (2, 'legacy-admin', 'existing user', CURRENT_TIMESTAMP);
+        INSERT INTO apps_old (slug, html_content, created_at, updated_at)
+            VALUES ('hello', '<h1>ok</h1>', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP);
+        COMMIT;
         """
     )
-    now = datetime.utcnow()
-    c.execute(
-        "INSERT INTO users (id, key, comment, created_at) VALUES (2, ?, ?, ?)",
-        ("legacy-admin", "existing user", now),
-    )
-    c.execute(
-        "INSERT INTO apps_old (slug, html_content, created_at, updated_at) VALUES (?, ?, ?, ?)",
-        ("hello", "<h1>ok</h1>", now, now),
-    )
-    conn.commit()
     conn.close()
 
     db.init_db()
 
-    conn = sqlite3.connect(db_file)
+    conn = _connect()
     c = conn.cursor()
     c.execute("SELECT id, key FROM users WHERE id = 1")
     admin = c.fetchone()
@@ -61,3 +56,47 @@ def test_init_db_recovers_when_legacy_admin_key_taken_by_another_user():
     assert admin is not None
     assert apps == [("hello", 1)]
     assert apps_old_exists is None
+
+
+def test_init_db_converts_text_timestamps_to_epoch_ms():
+    conn = _connect()
+    conn.execute(
+        "INSERT INTO apps (slug, user_id, html_content, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+        ("legacy", 1, "<p>old</p>", "2024-01-02 03:04:05.678000", "2024-01-02 03:04:05.678000"),
+    )
+    conn.commit()
+    conn.close()
+
+    db.init_db()
+
+    app_data = db.get_app("legacy")
+    assert app_data["created_at"] == 1704164645678
+    assert app_data["updated_at"] == 1704164645678
+
+
+def test_init_db_migrates_single_user_apps_table():
+    conn = _connect()
+    c = conn.cursor()
+    c.execute("DROP TABLE apps")
+    c.execute(
+        """
+        CREATE TABLE apps (
+            slug TEXT PRIMARY KEY,
+            html_content TEXT,
+            created_at TIMESTAMP,
+            updated_at TIMESTAMP
+        )
+        """
+    )
+    c.execute(
+        "INSERT INTO apps (slug, html_content, created_at, updated_at) VALUES (?, ?, ?, ?)",
+        ("old", "<p>old</p>", "2024-01-02 03:04:05", "2024-01-02 03:04:05"),
+    )
+    conn.commit()
+    conn.close()
+
+    db.init_db()
+
+    app_data = db.get_app("old", user_id=1)
+    assert app_data["html_content"] == "<p>old</p>"
+    assert app_data["updated_at"] == 1704164645000
@@ -1,79 +1,66 @@
 import pytest
-from fastapi.testclient import TestClient
-from main import app, DEFAULT_SECRET, sign_data, compress_payload
+from main import DEFAULT_SECRET, sign_data, compress_payload
 import db
-import uuid
 
-client = TestClient(app)
 TEST_KEY = DEFAULT_SECRET
 
-def test_stats_tracking():
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def stats_user(make_user):
+    """
+    Creates a test user and returns (key, user_id).
+    The DB is per test (conftest.test_db), so this runs per test as well.
+    """
+    return make_user("Stats User")
+
+def test_stats_tracking(stats_user):
+    # Seed the activity straight into the DB and read the counters back from it
+    # (endpoint logging is covered by the attribution tests and test_main)
     # 1. Create User
-    ukey = f"mini{uuid.uuid4()}"
-    resp = client.post("/api/users", json={
-        "admin_key": TEST_KEY,
-        "key": ukey,
-        "comment": "Stats User"
-    })
-    uid = resp.json()['id']
+    ukey, uid = stats_user
 
     # 2. User generates a link (Stateless Generate)
-    html = "<h1>Stateless</h1>"
-    resp = client.post("/api/generate", json={
-        "key": ukey,
-        "html": html,
-        "compress": False
-    })
-    url = resp.json()['url']
+    db.log_action(uid, 'generate')
 
     # 3. User views the stateless link (Stateless View)
-    query_string = url.split("?")[1]
-    client.get(f"/?{query_string}")
+    db.log_action(uid, 'view_stateless')
 
     # 4. User saves an app (App Count)
-    client.post("/api/apps", json={"key": ukey, "slug": "stat-app", "html": "Persistent"})
+    db.save_app("stat-app", "Persistent", user_id=uid)
 
     # 5. User views the app (Persistent View)
-    client.get(f"/p{uid}/stat-app")
-
-    # 6. Verify Stats via Admin API
-    resp = client.get(f"/api/users?key={TEST_KEY}")
-    users = resp.json()
-
-    target_user = next(u for u in users if u['id'] == uid)
-    stats = target_user['stats']
+    db.log_action(uid, 'view_persistent', slug="stat-app")
 
-    print(f"Stats for User {uid}: {stats}")
+    # 6. Verify Stats (the /api/users serialization is covered by test_stats_view_persistent_admin)
+    stats = db.get_user_stats(uid)
 
     assert stats['generated'] == 1
     assert stats['view_stateless'] == 1
     assert stats['apps_count'] == 1
     assert stats['view_persistent'] == 1
 
-def test_stats_view_stateless_attribution():
+async def test_stats_view_stateless_attribution(async_client, stats_user):
     # Ensure view is attributed to the KEY OWNER, not necessarily who viewed it (since viewer is anonymous)
-    # 1. Create User A
-    key_a = f"mini{uuid.uuid4()}"
-    client.post("/api/users", json={"admin_key": TEST_KEY, "key": key_a, "comment": "A"})
+    # 1. User A
+    key_a, uid_a = stats_user
 
     # 2. User A generates link
     payload = compress_payload("Test")
     sig = sign_data(payload, key_a)
 
     # 3. Anonymous view
-    client.get(f"/?d={payload}&s={sig}")
+    await async_client.get(f"/?d={payload}&s={sig}")
 
     # 4. Verify User A got the view count
-    resp = client.get(f"/api/users?key={TEST_KEY}")
-    target = next(u for u in resp.json() if u['key'] == key_a)
-    assert target['stats']['view_stateless'] == 1
+    assert db.get_user_stats(uid_a)['view_stateless'] == 1
 
-def test_stats_view_persistent_admin():
+async def test_stats_view_persistent_admin(async_client):
     # Admin view counts too
-    client.post("/api/apps", json={"key": TEST_KEY, "slug": "admin-stat", "html": "Admin App"})
-    client.get("/p/admin-stat")
+    await async_client.post("/api/apps", json={"key": TEST_KEY, "slug": "admin-stat", "html": "Admin App"})
+    await async_client.get("/p/admin-stat")
 
-    resp = client.get(f"/api/users?key={TEST_KEY}")
+    resp = await async_client.get(f"/api/users?key={TEST_KEY}")
     admin = next(u for u in resp.json() if u['id'] == 1)
 
     # We don't know initial state (test pollution?), so check > 0
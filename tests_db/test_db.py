@@ -1,38 +1,49 @@
 import pytest
-import sys
-from pathlib import Path
-
-# Add app directory to path
-app_dir = Path(__file__).parent.parent / "app"
-sys.path.insert(0, str(app_dir))
+import sqlite3
 
 import db
 
-@pytest.fixture
-def isolated_db(monkeypatch, tmp_path):
+@pytest.fixture(scope="module")
+def schema(tmp_path_factory):
     """
-    Setup a temporary database for the test.
+    One database per module: tables, indexes and migrations are built once.
     """
-    d = tmp_path / "data"
-    d.mkdir()
-    db_file = d / "test_db.db"
+    db_file = tmp_path_factory.mktemp("data") / "test_db.db"
 
-    # Monkeypatch the DB_PATH in the db module
-    monkeypatch.setattr(db, "DB_PATH", str(db_file))
+    with pytest.MonkeyPatch.context() as mp:
+        # Monkeypatch the DB_PATH in the db module
+        mp.setattr(db, "DB_PATH", str(db_file))
+        db.init_db()
+        yield db_file
 
-    # Initialize the DB
-    db.init_db()
+@pytest.fixture
+def isolated_db(schema):
+    """
+    Empty the tables before each test instead of recreating the schema.
+    """
+    # Queued access logs from the previous test would land after the wipe
+    db.flush_logs()
+    with db.get_conn() as conn:
+        conn.executescript(
+            """
+            BEGIN;
+            DELETE FROM access_logs;
+            DELETE FROM apps;
+            DELETE FROM users WHERE id > 1;
+            COMMIT;
+            """
+        )
+    # The rows changed behind the db module's back, so drop its read caches
+    db._invalidate_users_cache()
+    db._invalidate_apps_cache()
 
-    return db_file
+    return schema
 
 def test_create_user_success(isolated_db):
     key = "test-key-new"
     comment = "New User"
-    user_id = db.create_user(key, comment)
-    assert user_id is not None
-
-    user = db.get_user_by_key(key)
-    assert user is not None
+    user = db.create_user(key, comment)
+    assert user["id"] is not None
     assert user["key"] == key
     assert user["comment"] == comment
 
@@ -42,3 +53,103 @@ def test_create_user_duplicate(isolated_db):
 
     with pytest.raises(ValueError, match="Key already exists"):
         db.create_user(key, "Duplicate")
+
+def test_save_app_upsert_keeps_created_at(isolated_db):
+    db.sync_admin_key("admin-key")
+    db.save_app("upsert", "<p>v1</p>")
+    first = db.get_app("upsert")
+
+    db.save_app("upsert", "<p>v2</p>")
+    second = db.get_app("upsert")
+
+    assert second["html_content"] == "<p>v2</p>"
+    assert second["created_at"] == first["created_at"]
+    assert len(db.list_apps(user_id=1)) == 1
+
+def test_init_db_creates_indexes(isolated_db):
+    conn = sqlite3.connect(isolated_db)
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type='index'").fetchall()
+    conn.close()
+
+    names = {r[0] for r in rows}
+    assert "idx_apps_user_updated" in names
+    assert "idx_logs_user_action" in names
+
+def test_log_action_rows_are_written_on_flush(isolated_db):
+    db.sync_admin_key("admin-key")
+    db.flush_logs()
+
+    db.log_action(1, "generate")
+    db.log_action(1, "view_persistent", slug="app")
+
+    db.flush_logs()
+    stats = db.get_users_stats()
+    assert stats[1]["generated"] == 1
+    assert stats[1]["view_persistent"] == 1
+
+def test_flush_logs_drops_only_rows_that_violate_constraints(isolated_db):
+    db.sync_admin_key("admin-key")
+    db.flush_logs()
+
+    db.log_action(1, "generate")
+    db.log_action(9999, "generate")  # no such user: FK violation
+    db.log_action(1, "view_stateless")
+
+    assert db.flush_logs() == 2
+    stats = db.get_users_stats()
+    assert stats[1]["generated"] == 1
+    assert stats[1]["view_stateless"] == 1
+    assert 9999 not in stats
+
+def test_get_user_stats_matches_users_stats(isolated_db):
+    db.sync_admin_key("admin-key")
+    quiet_id = db.create_user("quiet-key")["id"]
+    db.log_action(1, "generate")
+    db.log_action(1, "view_stateless")
+    db.save_app("one", "x")
+
+    assert db.get_user_stats(1) == db.get_users_stats()[1]
+    assert db.get_user_stats(quiet_id) == {
+        "generated": 0, "view_stateless": 0, "view_persistent": 0, "apps_count": 0,
+    }
+
+def test_list_apps_limit_offset(isolated_db):
+    db.sync_admin_key("admin-key")
+    for i in range(5):
+        db.save_app(f"app{i}", "x")
+
+    assert len(db.list_apps(user_id=1)) == 5
+    page = db.list_apps(user_id=1, limit=2, offset=1)
+    assert len(page) == 2
+    assert len(db.list_apps(limit=3)) == 3
+
+def test_get_user_by_key_cache_sees_new_users(isolated_db):
+    assert db.get_user_by_key("late-key") is None
+
+    db.create_user("late-key", "Late")
+
+    user = db.get_user_by_key("late-key")
+    assert user is not None
+    # Callers get their own copy, not the cached row
+    user["comment"] = "mutated"
+    assert db.get_user_by_key("late-key")["comment"] == "Late"
+
+def test_pool_replaces_broken_connection(isolated_db):
+    with pytest.raises(sqlite3.ProgrammingError):
+        with db.get_conn() as conn:
+            conn.close()
+            conn.execute("SELECT 1")
+
+    assert conn.healthy is False
+    # The pool hands out working connections afterwards
+    for _ in range(db.DB_POOL_SIZE + 1):
+        with db.get_conn() as c:
+            assert c.execute("SELECT 1").fetchone() == (1,)
+
+def test_isolated_db_uses_wal_and_normal_sync(isolated_db):
+    # Test DBs get the same pragmas as production: WAL + synchronous=NORMAL, so
+    # small writes (create_user, save_app) don't fsync twice per commit
+    with db.get_conn() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+        assert conn.execute("PRAGMA synchronous").fetchone() == (1,)
+        assert conn.execute("PRAGMA temp_store").fetchone() == (2,)